@@ -7,7 +7,8 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME", "travel_schema")
 
-SQLALCHEMY_DATABASE_URL = (
+# DATABASE_URL overrides the MySQL settings above (e.g. "sqlite://" for tests)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"mysql+mysqldb://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
@@ -16,3 +17,23 @@ USERS_TABLE = "users"
 TRIPS_TABLE = "trips"
 LOCATIONS_TABLE = "locations"
 TRIP_ENTRIES_TABLE = "trip_entries"
+JOBS_TABLE = "jobs"
+
+# Background jobs (see jobs.py). JOB_WORKERS=0 disables the worker loop.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = int(os.getenv("JOB_RETRY_BACKOFF", "30"))  # seconds, doubled per attempt
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # seconds
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "1800"))  # seconds a job may run before it is killed
+# Seconds after which a "running" job is assumed orphaned (its runner died) and requeued.
+# Must stay above JOB_TIMEOUT so live jobs of other processes are never reclaimed.
+JOB_LEASE_TIMEOUT = int(os.getenv("JOB_LEASE_TIMEOUT", "3600"))
+JOB_SHUTDOWN_GRACE = float(os.getenv("JOB_SHUTDOWN_GRACE", "10"))  # seconds running jobs get on app shutdown
+JOB_EXPORT_DIR = os.getenv("JOB_EXPORT_DIR", "exports")
+
+# Location ingest filter (see location_filter.py). A value of 0 disables that check.
+LOCATION_FILTER_ENABLED = os.getenv("LOCATION_FILTER_ENABLED", "true").lower() == "true"
+LOCATION_FILTER_MIN_DISTANCE = float(os.getenv("LOCATION_FILTER_MIN_DISTANCE", "5.0"))  # meters
+LOCATION_FILTER_MIN_INTERVAL = float(os.getenv("LOCATION_FILTER_MIN_INTERVAL", "0"))  # seconds
+LOCATION_FILTER_MAX_ACCURACY = float(os.getenv("LOCATION_FILTER_MAX_ACCURACY", "100.0"))  # meters
+LOCATION_FILTER_MAX_TRIPS = int(os.getenv("LOCATION_FILTER_MAX_TRIPS", "10000"))  # trips kept in memory
@@ -1,9 +1,13 @@
 import uuid
+import json
+import hashlib
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 import models, schemas
-from typing import Dict, Any
-from datetime import date
-from models import StatusEnum
+from typing import Dict, Any, List, Optional
+from datetime import date, datetime, timedelta
+from models import StatusEnum, JobStatusEnum
+from config import JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF
 
 
 def create_trip(db: Session, trip: schemas.TripCreate):
@@ -93,7 +97,7 @@ def end_trip(db: Session, trip_id: str):
     
     # Update trip to ended state
     db_trip.is_active = False
-    db_trip.status = StatusEnum.completed
+    db_trip.status = StatusEnum.inactive  # stored as "completed"
     db_trip.end_date = date.today()
     
     db.commit()
@@ -118,8 +122,8 @@ def update_trip_stats(db: Session, trip_id: str, stats: schemas.TripStatsUpdate)
     return db_trip
 
 
-def create_location(db: Session, trip_id: str, location: schemas.LocationCreate):
-    """Create a new location for a trip"""
+def create_location(db: Session, trip_id: str, location: schemas.LocationCreate, timestamp: Optional[datetime] = None):
+    """Create a new location for a trip (timestamp defaults to now, set by the DB)"""
     db_location = models.Location(
         location_id=str(uuid.uuid4()),
         trip_id=trip_id,
@@ -130,6 +134,8 @@ def create_location(db: Session, trip_id: str, location: schemas.LocationCreate)
         speed=location.speed,
         heading=location.heading,
     )
+    if timestamp is not None:
+        db_location.timestamp = timestamp
     db.add(db_location)
     db.commit()
     db.refresh(db_location)
@@ -147,6 +153,16 @@ def get_locations_by_trip(db: Session, trip_id: str, skip: int = 0, limit: int =
     )
 
 
+def get_track_by_trip(db: Session, trip_id: str):
+    """Get every location for a trip in recording order (no pagination)"""
+    return (
+        db.query(models.Location)
+        .filter(models.Location.trip_id == trip_id)
+        .order_by(models.Location.timestamp)
+        .all()
+    )
+
+
 def get_last_location_by_trip(db: Session, trip_id: str):
     """Get the last (most recent) location for a trip"""
     return (
@@ -203,4 +219,212 @@ def map_trip_to_response(db_trip: models.Trip) -> Dict[str, Any]:
         "cover_image_url": db_trip.cover_image_url,
         "status": db_trip.status,
         "delay": db_trip.delay,
-    }
\ No newline at end of file
+    }
+
+
+def _job_dedup_key(job_type: str, trip_id: Optional[str], payload: Optional[Dict[str, Any]]) -> str:
+    """Key identifying identical jobs: same type, same trip, same payload"""
+    payload_hash = hashlib.sha1(
+        json.dumps(payload or {}, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f"{job_type}:{trip_id or ''}:{payload_hash}"
+
+
+def _find_pending_job(db: Session, dedup_key: str):
+    return db.query(models.Job).filter(models.Job.pending_key == dedup_key).first()
+
+
+def enqueue_job(
+    db: Session,
+    job_type: str,
+    trip_id: Optional[str] = None,
+    payload: Optional[Dict[str, Any]] = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+):
+    """Queue a background job, reusing an identical job that is still pending.
+
+    The unique pending_key makes this safe against concurrent enqueues: the
+    losing insert fails and returns the job that won.
+    """
+    dedup_key = _job_dedup_key(job_type, trip_id, payload)
+    existing = _find_pending_job(db, dedup_key)
+    if existing:
+        return existing
+
+    db_job = models.Job(
+        job_id=str(uuid.uuid4()),
+        job_type=job_type,
+        trip_id=trip_id,
+        payload=payload,
+        dedup_key=dedup_key,
+        pending_key=dedup_key,
+        status=JobStatusEnum.pending,
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=datetime.now(),
+    )
+    db.add(db_job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = _find_pending_job(db, dedup_key)
+        if existing is None:
+            raise
+        return existing
+    db.refresh(db_job)
+    return db_job
+
+
+def get_job(db: Session, job_id: str):
+    return db.query(models.Job).filter(models.Job.job_id == job_id).first()
+
+
+def get_jobs_by_trip(db: Session, trip_id: str, skip: int = 0, limit: int = 100):
+    """Get all jobs for a trip, newest first, with pagination"""
+    return (
+        db.query(models.Job)
+        .filter(models.Job.trip_id == trip_id)
+        .order_by(models.Job.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+
+def get_runnable_jobs(db: Session, limit: int = 100) -> List[models.Job]:
+    """Get pending jobs whose retry delay has elapsed, oldest first"""
+    return (
+        db.query(models.Job)
+        .filter(
+            models.Job.status == JobStatusEnum.pending,
+            models.Job.run_after <= datetime.now(),
+        )
+        .order_by(models.Job.created_at)
+        .limit(limit)
+        .all()
+    )
+
+
+def claim_job(db: Session, job_id: str) -> bool:
+    """Atomically move a pending job to running; False if someone else got it first"""
+    claimed = (
+        db.query(models.Job)
+        .filter(
+            models.Job.job_id == job_id,
+            models.Job.status == JobStatusEnum.pending,
+        )
+        .update(
+            {
+                models.Job.status: JobStatusEnum.running,
+                models.Job.pending_key: None,
+                models.Job.attempts: models.Job.attempts + 1,
+                models.Job.started_at: datetime.now(),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return claimed == 1
+
+
+def _requeue_job(db: Session, db_job: models.Job, run_after: datetime):
+    """Put a job back to pending, unless an identical job got queued meanwhile"""
+    duplicate = _find_pending_job(db, db_job.dedup_key)
+    if duplicate is not None:
+        db_job.status = JobStatusEnum.failed
+        db_job.error = f"{db_job.error or 'Interrupted'}; superseded by pending job {duplicate.job_id}"
+        db_job.finished_at = datetime.now()
+        return
+    db_job.status = JobStatusEnum.pending
+    db_job.pending_key = db_job.dedup_key
+    db_job.run_after = run_after
+
+
+def complete_job(db: Session, job_id: str, result: Any = None):
+    """Mark a running job as succeeded and store its result"""
+    db_job = get_job(db, job_id)
+    if not db_job:
+        return None
+    db_job.status = JobStatusEnum.succeeded
+    db_job.result = result
+    db_job.error = None
+    db_job.finished_at = datetime.now()
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def fail_job(db: Session, job_id: str, error: str, retry: bool = True):
+    """Record a failed attempt; reschedule with exponential backoff until max_attempts is hit.
+
+    With retry=False the job fails for good (e.g. an unknown job type).
+    """
+    db_job = get_job(db, job_id)
+    if not db_job:
+        return None
+    db_job.error = error
+    if retry and db_job.attempts < db_job.max_attempts:
+        delay = JOB_RETRY_BACKOFF * (2 ** (db_job.attempts - 1))
+        _requeue_job(db, db_job, datetime.now() + timedelta(seconds=delay))
+    else:
+        db_job.status = JobStatusEnum.failed
+        db_job.finished_at = datetime.now()
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def release_job(db: Session, job_id: str):
+    """Return a claimed job that never ran to the queue without using up an attempt"""
+    db_job = get_job(db, job_id)
+    if not db_job or db_job.status != JobStatusEnum.running:
+        return db_job
+    db_job.attempts = max(db_job.attempts - 1, 0)
+    _requeue_job(db, db_job, datetime.now())
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def requeue_orphaned_jobs(db: Session, lease_timeout: int) -> int:
+    """Requeue jobs left running longer than lease_timeout seconds by a runner that died.
+
+    Jobs of live runners are never that old since they are killed after JOB_TIMEOUT.
+    """
+    orphaned = (
+        db.query(models.Job)
+        .filter(
+            models.Job.status == JobStatusEnum.running,
+            models.Job.started_at < datetime.now() - timedelta(seconds=lease_timeout),
+        )
+        .all()
+    )
+    for db_job in orphaned:
+        db_job.error = "Job runner lost while running"
+        if db_job.attempts < db_job.max_attempts:
+            _requeue_job(db, db_job, datetime.now())
+        else:
+            db_job.status = JobStatusEnum.failed
+            db_job.finished_at = datetime.now()
+    db.commit()
+    return len(orphaned)
+
+
+def map_job_to_response(db_job: models.Job) -> Dict[str, Any]:
+    """Map database job model to API response format"""
+    return {
+        "id": db_job.job_id,
+        "job_type": db_job.job_type,
+        "trip_id": db_job.trip_id,
+        "payload": db_job.payload,
+        "status": db_job.status,
+        "attempts": db_job.attempts,
+        "max_attempts": db_job.max_attempts,
+        "result": db_job.result,
+        "error": db_job.error,
+        "run_after": db_job.run_after,
+        "created_at": db_job.created_at,
+        "started_at": db_job.started_at,
+        "finished_at": db_job.finished_at,
+    }
@@ -0,0 +1,63 @@
+import math
+from typing import List, Sequence, Tuple
+
+EARTH_RADIUS_M = 6371000.0
+
+Point = Tuple[float, float]  # (latitude, longitude) in degrees
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def path_length(points: Sequence[Point]) -> float:
+    """Total length of a polyline in meters"""
+    return sum(
+        haversine(a[0], a[1], b[0], b[1]) for a, b in zip(points, points[1:])
+    )
+
+
+def _to_xy(point: Point, origin: Point) -> Tuple[float, float]:
+    """Project to local meters around origin (equirectangular, fine for short segments)"""
+    x = math.radians(point[1] - origin[1]) * math.cos(math.radians(origin[0])) * EARTH_RADIUS_M
+    y = math.radians(point[0] - origin[0]) * EARTH_RADIUS_M
+    return x, y
+
+
+def _segment_distance(p: Point, a: Point, b: Point) -> float:
+    """Distance in meters from p to the segment a-b"""
+    px, py = _to_xy(p, a)
+    bx, by = _to_xy(b, a)
+    seg_len_sq = bx * bx + by * by
+    if seg_len_sq == 0:
+        return math.hypot(px, py)
+    t = max(0.0, min(1.0, (px * bx + py * by) / seg_len_sq))
+    return math.hypot(px - t * bx, py - t * by)
+
+
+def simplify(points: Sequence[Point], tolerance: float) -> List[Point]:
+    """Douglas-Peucker simplification; tolerance in meters"""
+    if len(points) < 3:
+        return list(points)
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        max_dist, index = 0.0, start
+        for i in range(start + 1, end):
+            dist = _segment_distance(points[i], points[start], points[end])
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if max_dist > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [point for point, kept in zip(points, keep) if kept]
@@ -0,0 +1,410 @@
+"""In-process background jobs.
+
+Jobs are rows in the jobs table (see models.Job). A JobRunner thread started
+with the app polls for pending jobs, claims them and runs the task functions in
+a process pool, so CPU-heavy work never blocks a request handler. No external
+broker is needed: the database is the queue.
+
+Several app processes may each run a runner: claiming is atomic, jobs running
+longer than JOB_TIMEOUT are killed, and only jobs "running" for longer than
+JOB_LEASE_TIMEOUT (i.e. whose runner died) are requeued.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+from xml.sax.saxutils import escape
+
+from pydantic import BaseModel
+import crud, geo, schemas
+from config import (
+    JOB_WORKERS,
+    JOB_POLL_INTERVAL,
+    JOB_EXPORT_DIR,
+    JOB_TIMEOUT,
+    JOB_LEASE_TIMEOUT,
+    JOB_SHUTDOWN_GRACE,
+)
+from database import SessionLocal
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Tasks. These run in pool processes: they must be module-level functions,
+# open their own DB session and return something JSON-serializable.
+# ---------------------------------------------------------------------------
+
+def recompute_trip_stats(trip_id: str) -> Dict[str, Any]:
+    """Recompute total_distance and duration (seconds) from the recorded track.
+
+    total_distance is written in meters and replaces whatever the client sent via
+    PUT /api/trips/{trip_id}/stats. With fewer than two stored locations there is
+    nothing to measure, so the existing stats are left alone.
+    """
+    db = SessionLocal()
+    try:
+        track = crud.get_track_by_trip(db, trip_id=trip_id)
+        if len(track) < 2:
+            if crud.get_trip(db, trip_id=trip_id) is None:
+                raise ValueError(f"Trip {trip_id} not found")
+            return {"skipped": "fewer than 2 locations", "points": len(track)}
+
+        points = [(loc.latitude, loc.longitude) for loc in track]
+        total_distance = geo.path_length(points)  # meters
+        duration = int((track[-1].timestamp - track[0].timestamp).total_seconds())
+
+        stats = schemas.TripStatsUpdate(total_distance=total_distance, duration=duration)
+        if crud.update_trip_stats(db, trip_id=trip_id, stats=stats) is None:
+            raise ValueError(f"Trip {trip_id} not found")
+        return {"total_distance": total_distance, "duration": duration, "points": len(track)}
+    finally:
+        db.close()
+
+
+def build_simplified_track(trip_id: str, tolerance: float = 5.0) -> Dict[str, Any]:
+    """Douglas-Peucker simplified track; tolerance in meters"""
+    db = SessionLocal()
+    try:
+        track = crud.get_track_by_trip(db, trip_id=trip_id)
+        points = [(loc.latitude, loc.longitude) for loc in track]
+    finally:
+        db.close()
+
+    simplified = geo.simplify(points, tolerance)
+    return {
+        "tolerance": tolerance,
+        "original_points": len(points),
+        "points": [[lat, lon] for lat, lon in simplified],
+    }
+
+
+def export_trip_gpx(trip_id: str) -> Dict[str, Any]:
+    """Write the trip track as a GPX file under JOB_EXPORT_DIR"""
+    db = SessionLocal()
+    try:
+        trip = crud.get_trip(db, trip_id=trip_id)
+        if trip is None:
+            raise ValueError(f"Trip {trip_id} not found")
+        title = trip.title
+        track = crud.get_track_by_trip(db, trip_id=trip_id)
+        trkpts = []
+        for loc in track:
+            ele = f"<ele>{loc.altitude}</ele>" if loc.altitude is not None else ""
+            trkpts.append(
+                f'      <trkpt lat="{loc.latitude}" lon="{loc.longitude}">'
+                f"{ele}<time>{loc.timestamp.isoformat()}Z</time></trkpt>"
+            )
+    finally:
+        db.close()
+
+    gpx = "\n".join([
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<gpx version="1.1" creator="TrailTrekker" xmlns="http://www.topografix.com/GPX/1/1">',
+        "  <trk>",
+        f"    <name>{escape(title)}</name>",
+        "    <trkseg>",
+        *trkpts,
+        "    </trkseg>",
+        "  </trk>",
+        "</gpx>",
+        "",
+    ])
+
+    os.makedirs(JOB_EXPORT_DIR, exist_ok=True)
+    path = os.path.join(JOB_EXPORT_DIR, f"{trip_id}.gpx")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(gpx)
+    os.replace(tmp_path, path)
+    return {"path": path, "points": len(trkpts)}
+
+
+@dataclass(frozen=True)
+class TaskSpec:
+    func: Callable[..., Any]
+    payload_model: Type[BaseModel] = schemas.EmptyJobPayload  # allowed payload keys and types
+    max_concurrency: int = 1  # jobs of this type running at once
+
+
+TASKS: Dict[str, TaskSpec] = {
+    "recompute_trip_stats": TaskSpec(recompute_trip_stats, max_concurrency=2),
+    "build_simplified_track": TaskSpec(
+        build_simplified_track, schemas.SimplifiedTrackPayload, max_concurrency=2
+    ),
+    "export_trip_gpx": TaskSpec(export_trip_gpx, max_concurrency=1),
+}
+
+# Jobs queued when a trip is ended
+TRIP_ENDED_JOBS = ["recompute_trip_stats", "build_simplified_track", "export_trip_gpx"]
+
+
+def validate_payload(job_type: str, payload: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Check a payload against the task's payload model; raises pydantic.ValidationError.
+
+    Returns the payload with defaults filled in, so requests that spell out a default
+    and requests that omit it dedup to the same job.
+    """
+    model = TASKS[job_type].payload_model(**(payload or {}))
+    return model.dict() or None
+
+
+def enqueue_trip_ended(db: Session, trip_id: str):
+    """Queue the derived-data jobs for a trip that was just ended"""
+    return [
+        crud.enqueue_job(db, job_type, trip_id=trip_id, payload=validate_payload(job_type, None))
+        for job_type in TRIP_ENDED_JOBS
+    ]
+
+
+def _run_task(job_type: str, trip_id: Optional[str], payload: Optional[Dict[str, Any]]):
+    """Entry point inside a pool process"""
+    kwargs = dict(payload or {})  # validated by validate_payload() when queued
+    if trip_id is not None:
+        kwargs["trip_id"] = trip_id
+    return TASKS[job_type].func(**kwargs)
+
+
+def _terminate_executor(executor: ProcessPoolExecutor):
+    """Shut a pool down without waiting, killing workers that may be stuck"""
+    # No public API to kill workers before Python 3.14 (terminate_workers)
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+class JobRunner:
+    """Polls the jobs table and dispatches work to a process pool"""
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        timeout: float = JOB_TIMEOUT,
+        lease_timeout: int = JOB_LEASE_TIMEOUT,
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.lease_timeout = lease_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Tuple[str, float]] = {}  # job_id -> (job_type, monotonic start)
+        self._next_reclaim = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._executor = self._new_executor()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def stop(self, grace: float = JOB_SHUTDOWN_GRACE):
+        """Stop dispatching and give running jobs `grace` seconds to finish.
+
+        Jobs still running after that are killed and released back to the queue
+        (without using up an attempt), so another runner can pick them up at once.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+
+        deadline = time.monotonic() + grace
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._inflight:
+                    break
+            time.sleep(0.1)
+
+        with self._lock:
+            unfinished = list(self._inflight)
+            self._inflight.clear()
+        if not unfinished:
+            executor.shutdown(wait=True)
+            return
+
+        logger.warning("Killing %d unfinished job(s) on shutdown", len(unfinished))
+        _terminate_executor(executor)
+        db = SessionLocal()
+        try:
+            for job_id in unfinished:
+                crud.release_job(db, job_id)
+        except Exception:
+            logger.exception("Could not release unfinished jobs")
+        finally:
+            db.close()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            running: Dict[str, int] = {}
+            for job_type, _ in self._inflight.values():
+                running[job_type] = running.get(job_type, 0) + 1
+        return {
+            "enabled": self._thread is not None,
+            "workers": self.workers,
+            "running": running,
+        }
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn, not fork: forking this multi-threaded server can deadlock the child
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> bool:
+        """Swap in a fresh pool, unless this one was already replaced (or we are stopping)"""
+        with self._lock:
+            if self._executor is not broken or self._stop.is_set():
+                return False
+            self._executor = self._new_executor()
+        _terminate_executor(broken)
+        return True
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._reclaim_orphans()
+                self._kill_timed_out()
+                self._dispatch()
+            except Exception:
+                logger.exception("Job runner iteration failed")
+            self._stop.wait(self.poll_interval)
+
+    def _reclaim_orphans(self):
+        now = time.monotonic()
+        if now < self._next_reclaim:
+            return
+        self._next_reclaim = now + min(60.0, self.lease_timeout / 10)
+        db = SessionLocal()
+        try:
+            requeued = crud.requeue_orphaned_jobs(db, self.lease_timeout)
+            if requeued:
+                logger.info("Reclaimed %d orphaned job(s)", requeued)
+        finally:
+            db.close()
+
+    def _kill_timed_out(self):
+        now = time.monotonic()
+        with self._lock:
+            timed_out = [
+                job_id for job_id, (_, started) in self._inflight.items()
+                if now - started > self.timeout
+            ]
+            executor = self._executor
+        if not timed_out:
+            return
+        # A stuck worker can only be stopped by killing the pool; the other jobs in
+        # it then fail with BrokenProcessPool and are retried as usual
+        for job_id in timed_out:
+            self._finish(job_id, error=f"Timed out after {self.timeout:.0f}s")
+        self._replace_executor(executor)
+
+    def _dispatch(self):
+        with self._lock:
+            free = self.workers - len(self._inflight)
+        if free <= 0:
+            return
+
+        db = SessionLocal()
+        try:
+            # Fetch more than free slots so a saturated job type doesn't starve others
+            for job in crud.get_runnable_jobs(db, limit=free * 4):
+                if free <= 0:
+                    break
+                spec = TASKS.get(job.job_type)
+                with self._lock:
+                    running_of_type = sum(1 for t, _ in self._inflight.values() if t == job.job_type)
+                if spec is not None and running_of_type >= spec.max_concurrency:
+                    continue
+                if not crud.claim_job(db, job.job_id):
+                    continue
+                if spec is None:
+                    crud.fail_job(db, job.job_id, f"Unknown job type: {job.job_type}", retry=False)
+                    continue
+                if self._submit(job.job_id, job.job_type, job.trip_id, job.payload):
+                    free -= 1
+                else:
+                    crud.release_job(db, job.job_id)
+        finally:
+            db.close()
+
+    def _submit(self, job_id: str, job_type: str, trip_id: Optional[str], payload: Optional[Dict[str, Any]]) -> bool:
+        with self._lock:
+            executor = self._executor
+            self._inflight[job_id] = (job_type, time.monotonic())
+        try:
+            future = executor.submit(_run_task, job_type, trip_id, payload)
+        except (BrokenProcessPool, RuntimeError):
+            # Pool broke (or is shutting down) before the job started; it is released
+            # back to the queue and the pool gets replaced when the failure is seen
+            with self._lock:
+                self._inflight.pop(job_id, None)
+            return False
+        future.add_done_callback(
+            lambda f, job_id=job_id, executor=executor: self._on_done(job_id, executor, f)
+        )
+        return True
+
+    def _on_done(self, job_id: str, executor: ProcessPoolExecutor, future: Future):
+        if future.cancelled():
+            # Pool shut down before the job started: back to the queue, attempt not used
+            with self._lock:
+                if self._inflight.pop(job_id, None) is None:
+                    return
+            db = SessionLocal()
+            try:
+                crud.release_job(db, job_id)
+            except Exception:
+                logger.exception("Could not release job %s", job_id)
+            finally:
+                db.close()
+            return
+        error = future.exception()
+        # A worker died (e.g. OOM); later jobs need a fresh pool. If the pool was
+        # already swapped out, it was killed on purpose (timeout or shutdown).
+        if isinstance(error, BrokenProcessPool) and self._replace_executor(executor):
+            logger.warning("Process pool broken, restarted it")
+        if error is not None:
+            self._finish(job_id, error=f"{type(error).__name__}: {error}")
+        else:
+            self._finish(job_id, result=future.result())
+
+    def _finish(self, job_id: str, result: Any = None, error: Optional[str] = None):
+        with self._lock:
+            if self._inflight.pop(job_id, None) is None:
+                # Already settled, e.g. timed out before the pool reported back
+                return
+        db = SessionLocal()
+        try:
+            if error is None:
+                crud.complete_job(db, job_id, result)
+            else:
+                logger.warning("Job %s failed: %s", job_id, error)
+                crud.fail_job(db, job_id, error)
+        except Exception:
+            logger.exception("Could not record outcome of job %s", job_id)
+        finally:
+            db.close()
+
+
+runner = JobRunner()
@@ -0,0 +1,216 @@
+"""Server-side filtering of redundant GPS fixes before they are stored.
+
+A phone sitting still reports (almost) the same position every second. For each
+trip we remember the last accepted fix in memory and drop incoming fixes that
+are too inaccurate, too close to it, or arrive too soon after it. Only this
+small per-trip state is kept; nothing is read from the DB to decide.
+
+An accepted fix becomes the reference point while it is still being written, so
+concurrent posts for a trip are judged against it; a failed write rolls it back.
+The last fix dropped for being stationary is held back and stored when the trip
+ends, so the track still covers the whole trip duration.
+
+State (including per-trip setting overrides) lives in the process and is lost on
+restart, after which the first fix of a trip is simply accepted again.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import geo, schemas
+from config import (
+    LOCATION_FILTER_ENABLED,
+    LOCATION_FILTER_MIN_DISTANCE,
+    LOCATION_FILTER_MIN_INTERVAL,
+    LOCATION_FILTER_MAX_ACCURACY,
+    LOCATION_FILTER_MAX_TRIPS,
+)
+
+# Reasons a fix gets filtered
+LOW_ACCURACY = "low_accuracy"
+TOO_CLOSE = "too_close"
+TOO_SOON = "too_soon"
+
+
+@dataclass
+class FilterSettings:
+    enabled: bool = LOCATION_FILTER_ENABLED
+    min_distance: float = LOCATION_FILTER_MIN_DISTANCE  # meters from last accepted fix
+    min_interval: float = LOCATION_FILTER_MIN_INTERVAL  # seconds since last accepted fix
+    max_accuracy: float = LOCATION_FILTER_MAX_ACCURACY  # meters, larger is worse
+
+
+class IngestDecision(NamedTuple):
+    accepted: bool
+    reason: Optional[str] = None
+    last_location: Optional[Dict[str, Any]] = None  # last stored location, for filtered fixes
+
+
+@dataclass
+class _Reference:
+    """The accepted fix new fixes are compared against"""
+    position: Tuple[float, float]
+    time: float  # time.monotonic() when accepted
+    stored_at: Optional[datetime] = None  # DB timestamp, once written
+    response: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class _TripState:
+    settings: Optional[FilterSettings] = None  # None means use the defaults
+    reference: Optional[_Reference] = None
+    previous: Optional[_Reference] = None  # restored if the reserved fix fails to store
+    trailing: Optional[Tuple[schemas.LocationCreate, float]] = None  # last stationary fix dropped
+    accepted: int = 0
+    filtered: Dict[str, int] = field(default_factory=dict)
+
+
+class LocationIngestFilter:
+    """Decides per trip whether an incoming fix is worth storing"""
+
+    def __init__(self, settings: Optional[FilterSettings] = None, max_trips: int = LOCATION_FILTER_MAX_TRIPS):
+        self.defaults = settings or FilterSettings()
+        self.max_trips = max_trips
+        self._lock = threading.Lock()
+        self._trips: "OrderedDict[str, _TripState]" = OrderedDict()
+        self._accepted = 0
+        self._filtered: Dict[str, int] = {}
+
+    def _state(self, trip_id: str) -> _TripState:
+        # Least recently used trips are evicted once max_trips is reached
+        state = self._trips.get(trip_id)
+        if state is None:
+            state = self._trips[trip_id] = _TripState()
+            if len(self._trips) > self.max_trips:
+                self._trips.popitem(last=False)
+        else:
+            self._trips.move_to_end(trip_id)
+        return state
+
+    def check(self, trip_id: str, location: schemas.LocationCreate) -> IngestDecision:
+        """Decide whether to store an incoming fix.
+
+        An accepted fix is reserved as the new reference point straight away; follow
+        up with record_accepted() once stored, or rollback() if storing failed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(trip_id)
+            settings = state.settings or self.defaults
+            reference = state.reference
+            reason = None
+
+            if settings.enabled:
+                if (
+                    settings.max_accuracy > 0
+                    and location.accuracy is not None
+                    and location.accuracy > settings.max_accuracy
+                ):
+                    reason = LOW_ACCURACY
+                elif reference is not None:
+                    if settings.min_interval > 0 and now - reference.time < settings.min_interval:
+                        reason = TOO_SOON
+                    elif settings.min_distance > 0:
+                        distance = geo.haversine(
+                            reference.position[0], reference.position[1],
+                            location.latitude, location.longitude,
+                        )
+                        if distance < settings.min_distance:
+                            reason = TOO_CLOSE
+
+            if reason is None:
+                state.previous = reference
+                state.reference = _Reference((location.latitude, location.longitude), now)
+                state.trailing = None
+                return IngestDecision(True)
+
+            if reason != LOW_ACCURACY:
+                state.trailing = (location, now)
+            state.filtered[reason] = state.filtered.get(reason, 0) + 1
+            self._filtered[reason] = self._filtered.get(reason, 0) + 1
+            return IngestDecision(False, reason, reference.response if reference else None)
+
+    def record_accepted(self, trip_id: str, location: schemas.LocationCreate, response: Dict[str, Any], stored_at: datetime):
+        """Attach the stored row to the reference point reserved by check()"""
+        with self._lock:
+            state = self._state(trip_id)
+            reference = state.reference
+            if reference is not None and reference.position == (location.latitude, location.longitude):
+                reference.stored_at = stored_at
+                reference.response = response
+            state.accepted += 1
+            self._accepted += 1
+
+    def rollback(self, trip_id: str, location: schemas.LocationCreate):
+        """Undo the reservation made by check() for a fix that could not be stored"""
+        with self._lock:
+            state = self._trips.get(trip_id)
+            if state is None or state.reference is None:
+                return
+            if state.reference.position == (location.latitude, location.longitude):
+                state.reference, state.previous = state.previous, None
+
+    def take_trailing(self, trip_id: str) -> Optional[Tuple[schemas.LocationCreate, datetime]]:
+        """Pop the last stationary fix dropped since the last stored one, with its timestamp.
+
+        The timestamp is derived from the stored reference row so it uses the DB clock.
+        """
+        with self._lock:
+            state = self._trips.get(trip_id)
+            if state is None or state.trailing is None:
+                return None
+            location, received = state.trailing
+            state.trailing = None
+            reference = state.reference
+            if reference is None or reference.stored_at is None:
+                return None
+            return location, reference.stored_at + timedelta(seconds=received - reference.time)
+
+    def get_settings(self, trip_id: str) -> FilterSettings:
+        with self._lock:
+            state = self._trips.get(trip_id)
+            return (state and state.settings) or self.defaults
+
+    def update_settings(self, trip_id: str, update: schemas.LocationFilterSettingsUpdate) -> FilterSettings:
+        """Override the default filter settings for one trip"""
+        with self._lock:
+            state = self._state(trip_id)
+            current = asdict(state.settings or self.defaults)
+            # null means "leave unchanged"
+            current.update(update.dict(exclude_unset=True, exclude_none=True))
+            state.settings = FilterSettings(**current)
+            return state.settings
+
+    def forget(self, trip_id: str):
+        """Drop all state for a deleted trip"""
+        with self._lock:
+            self._trips.pop(trip_id, None)
+
+    def trip_stats(self, trip_id: str) -> Dict[str, Any]:
+        with self._lock:
+            state = self._trips.get(trip_id) or _TripState()
+            return _stats(state.accepted, state.filtered)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = _stats(self._accepted, self._filtered)
+            result["tracked_trips"] = len(self._trips)
+            return result
+
+
+def _stats(accepted: int, filtered: Dict[str, int]) -> Dict[str, Any]:
+    total_filtered = sum(filtered.values())
+    received = accepted + total_filtered
+    return {
+        "received": received,
+        "accepted": accepted,
+        "filtered": total_filtered,
+        "filtered_by_reason": dict(filtered),
+        "filtered_ratio": total_filtered / received if received else 0.0,
+    }
+
+
+ingest_filter = LocationIngestFilter()
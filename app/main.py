@@ -1,7 +1,11 @@
 from fastapi import FastAPI, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-import crud, schemas, models
+from pydantic import ValidationError
+import crud, schemas, models, jobs
+from location_filter import ingest_filter
+from dataclasses import asdict
 from database import engine, Base, get_db
+from config import JOB_WORKERS
 from typing import List
 from datetime import datetime
 
@@ -10,6 +14,18 @@ Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="TrailTrekker App API", version="1.0.0")
 
+
+@app.on_event("startup")
+def start_job_runner():
+    if JOB_WORKERS > 0:
+        jobs.runner.start()
+
+
+@app.on_event("shutdown")
+def stop_job_runner():
+    jobs.runner.stop()
+
+
 @app.post("/api/trips")
 def create_trip(trip: schemas.TripCreate, db: Session = Depends(get_db)):
     db_trip = crud.create_trip(db=db, trip=trip)
@@ -53,13 +69,24 @@ def end_trip(trip_id: str, db: Session = Depends(get_db)):
     db_trip = crud.end_trip(db, trip_id=trip_id)
     if db_trip is None:
         raise HTTPException(status_code=404, detail="Trip not found")
+
+    # Store the last fix the ingest filter held back, so the track (and the
+    # duration derived from it) reaches the end of a final stationary stretch
+    trailing = ingest_filter.take_trailing(trip_id)
+    if trailing is not None:
+        location, timestamp = trailing
+        crud.create_location(db, trip_id=trip_id, location=location, timestamp=timestamp)
+
+    # Derived data (stats, simplified track, export) is built in the background
+    queued_jobs = jobs.enqueue_trip_ended(db, trip_id=trip_id)
     
     return {
         "message": "Trip ended successfully",
         "tripId": trip_id,
         "ended_at": db_trip.end_date.isoformat() + "Z" if db_trip.end_date else None,
         "status": "completed",
-        "delay": db_trip.delay
+        "delay": db_trip.delay,
+        "jobs": [job.job_id for job in queued_jobs]
     }
 
 @app.put("/api/trips/{trip_id}/stats")
@@ -84,10 +111,34 @@ def add_location(trip_id: str, location: schemas.LocationCreate, db: Session = D
     if trip is None:
         raise HTTPException(status_code=404, detail="Trip not found")
     
+    # Drop redundant fixes (stationary, too frequent, inaccurate) before they hit the DB.
+    # The response keeps the usual shape, describing the last stored location (all
+    # null if there is none yet), so existing clients keep working.
+    decision = ingest_filter.check(trip_id, location)
+    if not decision.accepted:
+        return {
+            "location_id": None,
+            "trip_id": trip_id,
+            "latitude": None,
+            "longitude": None,
+            "altitude": None,
+            "accuracy": None,
+            "speed": None,
+            "heading": None,
+            "timestamp": None,
+            **(decision.last_location or {}),
+            "accepted": False,
+            "filtered_reason": decision.reason,
+        }
+
     # Create the location
-    db_location = crud.create_location(db, trip_id=trip_id, location=location)
+    try:
+        db_location = crud.create_location(db, trip_id=trip_id, location=location)
+    except Exception:
+        ingest_filter.rollback(trip_id, location)
+        raise
     
-    return {
+    response = {
         "location_id": db_location.location_id,
         "trip_id": db_location.trip_id,
         "latitude": db_location.latitude,
@@ -98,6 +149,42 @@ def add_location(trip_id: str, location: schemas.LocationCreate, db: Session = D
         "heading": db_location.heading,
         "timestamp": db_location.timestamp.isoformat() + "Z"
     }
+    ingest_filter.record_accepted(trip_id, location, response, stored_at=db_location.timestamp)
+    return {**response, "accepted": True, "filtered_reason": None}
+
+@app.get("/api/trips/{trip_id}/locations/filter")
+def get_location_filter(trip_id: str, db: Session = Depends(get_db)):
+    """Get the ingest filter settings and accepted/filtered counts for a trip"""
+    # First verify the trip exists
+    trip = crud.get_trip(db, trip_id=trip_id)
+    if trip is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+
+    return {
+        "trip_id": trip_id,
+        "settings": asdict(ingest_filter.get_settings(trip_id)),
+        "stats": ingest_filter.trip_stats(trip_id),
+    }
+
+@app.put("/api/trips/{trip_id}/locations/filter")
+def update_location_filter(trip_id: str, settings: schemas.LocationFilterSettingsUpdate, db: Session = Depends(get_db)):
+    """Override the ingest filter settings for a trip (kept in memory only)"""
+    # First verify the trip exists
+    trip = crud.get_trip(db, trip_id=trip_id)
+    if trip is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+
+    updated = ingest_filter.update_settings(trip_id, settings)
+    return {
+        "trip_id": trip_id,
+        "settings": asdict(updated),
+        "stats": ingest_filter.trip_stats(trip_id),
+    }
+
+@app.get("/api/locations/filter/stats")
+def get_location_filter_stats():
+    """Accepted vs. filtered location counts across all trips since startup"""
+    return ingest_filter.stats()
 
 @app.get("/api/trips/{trip_id}/locations")
 def get_trip_locations(trip_id: str, skip: int = Query(0, ge=0, description="Number of locations to skip"), 
@@ -207,6 +294,49 @@ def get_trip_entries(trip_id: str, skip: int = Query(0, ge=0, description="Numbe
         for entry in entries
     ]
 
+@app.post("/api/trips/{trip_id}/jobs")
+def create_trip_job(trip_id: str, job: schemas.JobCreate, db: Session = Depends(get_db)):
+    """Queue a background job for a trip (identical pending jobs are reused)"""
+    # First verify the trip exists
+    trip = crud.get_trip(db, trip_id=trip_id)
+    if trip is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    if job.job_type not in jobs.TASKS:
+        raise HTTPException(status_code=400, detail=f"Unknown job type: {job.job_type}")
+    try:
+        payload = jobs.validate_payload(job.job_type, job.payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid payload for {job.job_type}: {e}")
+
+    db_job = crud.enqueue_job(db, job.job_type, trip_id=trip_id, payload=payload)
+    return crud.map_job_to_response(db_job)
+
+@app.get("/api/trips/{trip_id}/jobs")
+def get_trip_jobs(trip_id: str, skip: int = Query(0, ge=0, description="Number of jobs to skip"), 
+                  limit: int = Query(100, ge=1, le=1000, description="Maximum number of jobs to return"), 
+                  db: Session = Depends(get_db)):
+    """Get background jobs for a trip, newest first"""
+    # First verify the trip exists
+    trip = crud.get_trip(db, trip_id=trip_id)
+    if trip is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+
+    db_jobs = crud.get_jobs_by_trip(db, trip_id=trip_id, skip=skip, limit=limit)
+    return [crud.map_job_to_response(job) for job in db_jobs]
+
+@app.get("/api/jobs/runner")
+def get_job_runner_status():
+    """Worker pool status: whether it runs, pool size and jobs in flight per type"""
+    return jobs.runner.status()
+
+@app.get("/api/jobs/{job_id}")
+def read_job(job_id: str, db: Session = Depends(get_db)):
+    """Get the status of a background job"""
+    db_job = crud.get_job(db, job_id=job_id)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return crud.map_job_to_response(db_job)
+
 @app.get("/api/users/{user_id}/trips")
 def read_user_trips(user_id: str, db: Session = Depends(get_db)):
     trips = crud.get_trips_by_user(db, user_id=user_id)
@@ -217,4 +347,5 @@ def delete_trip(trip_id: str, db: Session = Depends(get_db)):
     deleted_trip = crud.delete_trip(db, trip_id=trip_id)
     if deleted_trip is None:
         raise HTTPException(status_code=404, detail="Trip not found")
+    ingest_filter.forget(trip_id)
     return crud.map_trip_to_response(deleted_trip)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import relationship
-from config import USERS_TABLE, TRIPS_TABLE, LOCATIONS_TABLE, TRIP_ENTRIES_TABLE
+from config import USERS_TABLE, TRIPS_TABLE, LOCATIONS_TABLE, TRIP_ENTRIES_TABLE, JOBS_TABLE
 from sqlalchemy import Column, String, Text, Date, Enum, Float, Integer, TIMESTAMP, ForeignKey, Boolean, Double, JSON
 from sqlalchemy.sql import func
 from database import Base
@@ -17,6 +17,13 @@ class StatusEnum(str, enum.Enum):
     inactive = "completed"
     draft = "draft"
 
+
+class JobStatusEnum(str, enum.Enum):
+    pending = "pending"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
 class User(Base):
     __tablename__ = USERS_TABLE
 
@@ -38,7 +45,7 @@ class Trip(Base):
     __tablename__ = TRIPS_TABLE
 
     trip_id = Column(String(36), primary_key=True, index=True)  # UUID
-    user_id = Column(String(36), ForeignKey("Users.user_id"), nullable=False)
+    user_id = Column(String(36), ForeignKey("users.user_id"), nullable=False)
 
     title = Column(String(255), nullable=False)
     description = Column(Text)
@@ -59,6 +66,9 @@ class Trip(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     published_at = Column(TIMESTAMP, nullable=True)
 
+    # Relationship back to user
+    owner = relationship("User", back_populates="trips")
+
     # Relationship to locations
     locations = relationship("Location", back_populates="trip")
     
@@ -107,3 +117,28 @@ class TripEntry(Base):
 
     # Relationship back to trip
     trip = relationship("Trip", back_populates="entries")
+
+
+class Job(Base):
+    __tablename__ = JOBS_TABLE
+
+    job_id = Column(String(36), primary_key=True, index=True)  # UUID
+    job_type = Column(String(100), nullable=False)
+    trip_id = Column(String(36), ForeignKey("trips.trip_id", ondelete="CASCADE"), nullable=True, index=True)
+
+    payload = Column(JSON, nullable=True)
+    # Identifies "the same job" for deduplication: job_type + trip_id + payload
+    dedup_key = Column(String(255), nullable=False, index=True)
+    # dedup_key while pending, NULL otherwise: the unique key allows one pending copy per job
+    pending_key = Column(String(255), nullable=True, unique=True)
+
+    status = Column(Enum(JobStatusEnum), nullable=False, default=JobStatusEnum.pending, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    run_after = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    started_at = Column(TIMESTAMP, nullable=True)
+    finished_at = Column(TIMESTAMP, nullable=True)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, confloat
+from typing import Optional, List, Any, Dict
 from datetime import date, datetime
 from enum import Enum
 
@@ -83,6 +83,14 @@ class LocationCreate(BaseModel):
     heading: Optional[float] = None
 
 
+class LocationFilterSettingsUpdate(BaseModel):
+    # Omitted or null fields keep their current value
+    enabled: Optional[bool] = None
+    min_distance: Optional[confloat(ge=0)] = None  # meters, 0 disables
+    min_interval: Optional[confloat(ge=0)] = None  # seconds, 0 disables
+    max_accuracy: Optional[confloat(ge=0)] = None  # meters, 0 disables
+
+
 class LocationResponse(BaseModel):
     location_id: str
     trip_id: str
@@ -124,3 +132,22 @@ class TripEntryResponse(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class JobCreate(BaseModel):
+    job_type: str
+    payload: Optional[Dict[str, Any]] = None
+
+
+class EmptyJobPayload(BaseModel):
+    """Payload for jobs that take no parameters besides the trip"""
+
+    class Config:
+        extra = "forbid"
+
+
+class SimplifiedTrackPayload(BaseModel):
+    tolerance: confloat(gt=0) = 5.0  # meters
+
+    class Config:
+        extra = "forbid"
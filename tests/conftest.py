@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# The app uses flat imports (import crud, models, ...) from inside app/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+# A file, not sqlite://, so TestClient's worker threads share one database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/trailtrekker.db")
+os.environ.setdefault("JOB_WORKERS", "0")  # jobs are queued but not run
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+@pytest.fixture
+def db():
+    from database import Base
+    import models  # noqa: F401  (registers the tables)
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def app_db():
+    """Session on the database the app itself uses"""
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def trip_id(client, app_db):
+    import models
+
+    user_id = str(uuid.uuid4())
+    app_db.add(models.User(
+        user_id=user_id, username=user_id, email=f"{user_id}@example.com", password_hash="x",
+    ))
+    app_db.commit()
+    response = client.post(
+        "/api/trips", json={"title": "Test trip", "start_date": "2025-06-01", "user_id": user_id}
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
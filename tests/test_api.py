@@ -0,0 +1,83 @@
+import time
+from datetime import timedelta
+
+import crud, jobs, models
+from models import JobStatusEnum, StatusEnum
+
+
+def test_end_trip_queues_derived_jobs(client, app_db, trip_id):
+    response = client.put(f"/api/trips/{trip_id}/end")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "completed"
+    assert len(body["jobs"]) == len(jobs.TRIP_ENDED_JOBS)
+
+    queued = [crud.get_job(app_db, job_id) for job_id in body["jobs"]]
+    assert sorted(job.job_type for job in queued) == sorted(jobs.TRIP_ENDED_JOBS)
+    assert all(job.trip_id == trip_id and job.status == JobStatusEnum.pending for job in queued)
+
+    trip = app_db.get(models.Trip, trip_id)
+    assert trip.status == StatusEnum.inactive
+    assert not trip.is_active
+
+
+def test_end_unknown_trip_is_404(client):
+    assert client.put("/api/trips/no-such-trip/end").status_code == 404
+
+
+def test_create_job_rejects_bad_payload(client, trip_id):
+    response = client.post(
+        f"/api/trips/{trip_id}/jobs",
+        json={"job_type": "recompute_trip_stats", "payload": {"foo": 1}},
+    )
+    assert response.status_code == 400
+
+
+def test_filtered_fix_keeps_location_response_shape(client, trip_id):
+    url = f"/api/trips/{trip_id}/locations"
+
+    inaccurate = client.post(url, json={"latitude": 0.0, "longitude": 0.0, "accuracy": 5000.0}).json()
+    assert inaccurate["accepted"] is False
+    assert inaccurate["filtered_reason"] == "low_accuracy"
+    assert inaccurate["location_id"] is None
+
+    stored = client.post(url, json={"latitude": 0.0, "longitude": 0.0}).json()
+    assert stored["accepted"] is True
+    assert stored["filtered_reason"] is None
+
+    repeated = client.post(url, json={"latitude": 0.0, "longitude": 0.0}).json()
+    assert repeated["accepted"] is False
+    assert repeated["filtered_reason"] == "too_close"
+    assert repeated["location_id"] == stored["location_id"]
+    assert repeated["timestamp"] == stored["timestamp"]
+    assert set(repeated) == set(stored)
+
+
+def test_end_trip_stores_trailing_stationary_fix(client, app_db, trip_id):
+    url = f"/api/trips/{trip_id}/locations"
+    assert client.post(url, json={"latitude": 0.0, "longitude": 0.0}).json()["accepted"]
+    assert client.post(url, json={"latitude": 0.001, "longitude": 0.0}).json()["accepted"]
+    time.sleep(0.2)
+    for _ in range(3):
+        stationary = client.post(url, json={"latitude": 0.001, "longitude": 0.00001})
+        assert stationary.json()["filtered_reason"] == "too_close"
+
+    assert client.put(f"/api/trips/{trip_id}/end").status_code == 200
+
+    track = crud.get_track_by_trip(app_db, trip_id=trip_id)
+    assert len(track) == 3
+    moving, trailing = track[1], track[2]
+    assert (trailing.latitude, trailing.longitude) == (0.001, 0.00001)
+    # Timestamp derived from the last stored row plus the time the fix arrived after it
+    assert moving.timestamp + timedelta(seconds=0.2) <= trailing.timestamp
+    assert trailing.timestamp < moving.timestamp + timedelta(seconds=5)
+
+
+def test_end_trip_jobs_dedup_with_explicit_default_payload(client, trip_id):
+    queued = client.put(f"/api/trips/{trip_id}/end").json()["jobs"]
+    response = client.post(
+        f"/api/trips/{trip_id}/jobs",
+        json={"job_type": "build_simplified_track", "payload": {"tolerance": 5.0}},
+    )
+    assert response.status_code == 200
+    assert response.json()["id"] in queued
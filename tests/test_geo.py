@@ -0,0 +1,42 @@
+import pytest
+
+import geo
+
+
+def test_haversine_one_degree_on_equator():
+    assert geo.haversine(0, 0, 0, 1) == pytest.approx(111195, rel=1e-3)
+
+
+def test_haversine_same_point_is_zero():
+    assert geo.haversine(52.5, 13.4, 52.5, 13.4) == 0
+
+
+def test_path_length_sums_segments():
+    points = [(0, 0), (0, 1), (0, 2)]
+    assert geo.path_length(points) == pytest.approx(2 * geo.haversine(0, 0, 0, 1))
+
+
+def test_path_length_of_short_paths_is_zero():
+    assert geo.path_length([]) == 0
+    assert geo.path_length([(1, 1)]) == 0
+
+
+def test_simplify_drops_collinear_points():
+    points = [(0, 0.001 * i) for i in range(10)]
+    assert geo.simplify(points, tolerance=1.0) == [points[0], points[-1]]
+
+
+def test_simplify_keeps_corners():
+    points = [(0, 0), (0, 0.0005), (0, 0.001), (0.0005, 0.001), (0.001, 0.001)]
+    assert geo.simplify(points, tolerance=1.0) == [(0, 0), (0, 0.001), (0.001, 0.001)]
+
+
+def test_simplify_respects_tolerance():
+    # Middle point is ~11 m off the straight line
+    points = [(0, 0), (0.0001, 0.001), (0, 0.002)]
+    assert geo.simplify(points, tolerance=20.0) == [points[0], points[2]]
+    assert geo.simplify(points, tolerance=5.0) == points
+
+
+def test_simplify_short_input_unchanged():
+    assert geo.simplify([(0, 0), (1, 1)], tolerance=100.0) == [(0, 0), (1, 1)]
@@ -0,0 +1,196 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+
+import crud, jobs, models
+from config import JOB_RETRY_BACKOFF
+from models import JobStatusEnum
+
+
+def _claimed_job(db, job_type="recompute_trip_stats", **kwargs):
+    job = crud.enqueue_job(db, job_type, **kwargs)
+    assert crud.claim_job(db, job.job_id)
+    db.refresh(job)
+    return job
+
+
+def test_enqueue_dedups_identical_pending_jobs(db):
+    first = crud.enqueue_job(db, "build_simplified_track", payload={"tolerance": 5.0})
+    second = crud.enqueue_job(db, "build_simplified_track", payload={"tolerance": 5.0})
+    other = crud.enqueue_job(db, "build_simplified_track", payload={"tolerance": 2.0})
+    assert first.job_id == second.job_id
+    assert other.job_id != first.job_id
+
+
+def test_enqueue_after_claim_creates_new_job(db):
+    running = _claimed_job(db)
+    assert running.pending_key is None
+    assert crud.enqueue_job(db, "recompute_trip_stats").job_id != running.job_id
+
+
+def test_pending_key_is_unique_in_db(db):
+    job = crud.enqueue_job(db, "recompute_trip_stats")
+    # Simulates a concurrent enqueue that passed the lookup before the insert
+    duplicate = models.Job(
+        job_id="dup", job_type=job.job_type, dedup_key=job.dedup_key,
+        pending_key=job.dedup_key, run_after=datetime.now(),
+    )
+    db.add(duplicate)
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+
+def test_claim_job_only_once(db):
+    job = crud.enqueue_job(db, "recompute_trip_stats")
+    assert crud.claim_job(db, job.job_id)
+    assert not crud.claim_job(db, job.job_id)
+    db.refresh(job)
+    assert job.status == JobStatusEnum.running
+    assert job.attempts == 1
+
+
+def test_fail_job_retries_with_exponential_backoff(db):
+    job = _claimed_job(db)
+
+    before = datetime.now()
+    job = crud.fail_job(db, job.job_id, "boom")
+    assert job.status == JobStatusEnum.pending
+    assert job.pending_key == job.dedup_key
+    assert job.run_after >= before + timedelta(seconds=JOB_RETRY_BACKOFF) - timedelta(seconds=1)
+
+    assert crud.claim_job(db, job.job_id)
+    before = datetime.now()
+    job = crud.fail_job(db, job.job_id, "boom")
+    assert job.status == JobStatusEnum.pending
+    assert job.run_after >= before + timedelta(seconds=2 * JOB_RETRY_BACKOFF) - timedelta(seconds=1)
+
+
+def test_fail_job_gives_up_after_max_attempts(db):
+    job = _claimed_job(db, max_attempts=1)
+    job = crud.fail_job(db, job.job_id, "boom")
+    assert job.status == JobStatusEnum.failed
+    assert job.error == "boom"
+    assert job.finished_at is not None
+
+
+def test_fail_job_without_retry(db):
+    job = _claimed_job(db, "no_such_job")
+    job = crud.fail_job(db, job.job_id, "Unknown job type", retry=False)
+    assert job.status == JobStatusEnum.failed
+    assert job.attempts == 1
+
+
+def test_retry_superseded_by_newer_pending_job(db):
+    job = _claimed_job(db)
+    newer = crud.enqueue_job(db, "recompute_trip_stats")
+    job = crud.fail_job(db, job.job_id, "boom")
+    assert job.status == JobStatusEnum.failed
+    assert newer.job_id in job.error
+
+
+def test_release_job_does_not_use_an_attempt(db):
+    job = _claimed_job(db)
+    job = crud.release_job(db, job.job_id)
+    assert job.status == JobStatusEnum.pending
+    assert job.attempts == 0
+
+
+def test_requeue_orphaned_jobs_respects_lease(db):
+    fresh = _claimed_job(db, "recompute_trip_stats")
+    stale = _claimed_job(db, "export_trip_gpx")
+    stale.started_at = datetime.now() - timedelta(hours=2)
+    db.commit()
+
+    assert crud.requeue_orphaned_jobs(db, lease_timeout=3600) == 1
+    db.refresh(fresh)
+    db.refresh(stale)
+    assert fresh.status == JobStatusEnum.running
+    assert stale.status == JobStatusEnum.pending
+
+
+def test_validate_payload_defaults_and_normalizes():
+    assert jobs.validate_payload("recompute_trip_stats", None) is None
+    assert jobs.validate_payload("recompute_trip_stats", {}) is None
+    assert jobs.validate_payload("build_simplified_track", None) == {"tolerance": 5.0}
+    assert jobs.validate_payload("build_simplified_track", {"tolerance": "2"}) == {"tolerance": 2.0}
+
+
+def test_explicit_default_payload_dedups_with_omitted_payload(db):
+    omitted = crud.enqueue_job(
+        db, "build_simplified_track", payload=jobs.validate_payload("build_simplified_track", None)
+    )
+    explicit = crud.enqueue_job(
+        db, "build_simplified_track",
+        payload=jobs.validate_payload("build_simplified_track", {"tolerance": 5.0}),
+    )
+    assert omitted.job_id == explicit.job_id
+
+
+@pytest.mark.parametrize(
+    "job_type, payload",
+    [
+        ("recompute_trip_stats", {"foo": 1}),
+        ("build_simplified_track", {"tolerance": "x"}),
+        ("build_simplified_track", {"tolerance": -1}),
+    ],
+)
+def test_validate_payload_rejects_bad_payloads(job_type, payload):
+    with pytest.raises(ValidationError):
+        jobs.validate_payload(job_type, payload)
+
+
+def test_recompute_trip_stats_measures_track(client, app_db, trip_id):
+    url = f"/api/trips/{trip_id}/locations"
+    client.post(url, json={"latitude": 0.0, "longitude": 0.0})
+    client.post(url, json={"latitude": 0.0, "longitude": 0.01})
+
+    result = jobs.recompute_trip_stats(trip_id)
+    assert result["points"] == 2
+    assert result["total_distance"] == pytest.approx(1112, rel=1e-2)  # meters
+    app_db.expire_all()
+    assert crud.get_trip(app_db, trip_id).total_distance == pytest.approx(result["total_distance"])
+
+
+def test_recompute_trip_stats_keeps_client_stats_for_short_track(client, app_db, trip_id):
+    client.put(f"/api/trips/{trip_id}/stats", json={"total_distance": 42.0, "duration": 600})
+    client.post(f"/api/trips/{trip_id}/locations", json={"latitude": 0.0, "longitude": 0.0})
+
+    result = jobs.recompute_trip_stats(trip_id)
+    assert result["points"] == 1
+    app_db.expire_all()
+    trip = crud.get_trip(app_db, trip_id)
+    assert (trip.total_distance, trip.duration) == (42.0, 600)
+
+
+def test_stop_releases_jobs_still_running_after_grace(app_db):
+    job = crud.enqueue_job(app_db, "recompute_trip_stats", payload={"stop_test": True})
+    assert crud.claim_job(app_db, job.job_id)
+
+    runner = jobs.JobRunner(workers=1)
+    runner._executor = runner._new_executor()
+    runner._inflight[job.job_id] = (job.job_type, 0.0)
+    runner.stop(grace=0)
+
+    app_db.expire_all()
+    job = crud.get_job(app_db, job.job_id)
+    assert job.status == JobStatusEnum.pending
+    assert job.attempts == 0
+    assert runner.status()["running"] == {}
+
+
+def test_broken_pool_of_replaced_executor_is_not_reported(caplog):
+    runner = jobs.JobRunner(workers=1)
+    killed = runner._new_executor()
+    runner._executor = runner._new_executor()
+    future = Future()
+    future.set_exception(BrokenProcessPool("killed"))
+
+    runner._on_done("unknown-job", killed, future)
+    assert "Process pool broken" not in caplog.text
+    runner.stop(grace=0)
+    killed.shutdown()
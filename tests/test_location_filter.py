@@ -0,0 +1,163 @@
+import time
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+
+import location_filter
+from location_filter import FilterSettings, LocationIngestFilter
+from schemas import LocationCreate, LocationFilterSettingsUpdate
+
+# ~1.1 m per 0.00001 degree of latitude
+STEP = 0.00001
+
+
+def _fix(lat=0.0, lon=0.0, accuracy=None):
+    return LocationCreate(latitude=lat, longitude=lon, accuracy=accuracy)
+
+
+def _store(ingest, trip_id, fix, stored_at=None):
+    decision = ingest.check(trip_id, fix)
+    if decision.accepted:
+        ingest.record_accepted(
+            trip_id, fix, {"location_id": f"{fix.latitude}"}, stored_at=stored_at or datetime.now()
+        )
+    return decision
+
+
+@pytest.fixture
+def ingest():
+    return LocationIngestFilter(FilterSettings(enabled=True, min_distance=5.0, min_interval=0, max_accuracy=50.0))
+
+
+def test_first_fix_is_accepted(ingest):
+    assert ingest.check("t", _fix()).accepted
+
+
+def test_fix_within_min_distance_is_dropped(ingest):
+    _store(ingest, "t", _fix())
+    decision = ingest.check("t", _fix(lat=2 * STEP))
+    assert not decision.accepted
+    assert decision.reason == location_filter.TOO_CLOSE
+    assert decision.last_location == {"location_id": "0.0"}
+
+
+def test_fix_beyond_min_distance_is_accepted(ingest):
+    _store(ingest, "t", _fix())
+    assert ingest.check("t", _fix(lat=10 * STEP)).accepted
+
+
+def test_inaccurate_fix_is_dropped_even_without_reference(ingest):
+    decision = ingest.check("t", _fix(accuracy=80.0))
+    assert decision == (False, location_filter.LOW_ACCURACY, None)
+
+
+def test_fix_within_min_interval_is_dropped():
+    ingest = LocationIngestFilter(FilterSettings(min_distance=0, min_interval=60, max_accuracy=0))
+    _store(ingest, "t", _fix())
+    assert ingest.check("t", _fix(lat=1.0)).reason == location_filter.TOO_SOON
+
+
+def test_disabled_filter_accepts_everything():
+    ingest = LocationIngestFilter(FilterSettings(enabled=False))
+    _store(ingest, "t", _fix())
+    assert ingest.check("t", _fix(accuracy=1000.0)).accepted
+
+
+def test_trips_are_filtered_independently(ingest):
+    _store(ingest, "a", _fix())
+    assert ingest.check("b", _fix()).accepted
+
+
+def test_accepted_fix_is_reserved_before_it_is_stored(ingest):
+    # Two concurrent posts of the same position: only the first may be stored
+    assert ingest.check("t", _fix()).accepted
+    assert ingest.check("t", _fix(lat=STEP)).reason == location_filter.TOO_CLOSE
+
+
+def test_rollback_restores_previous_reference(ingest):
+    _store(ingest, "t", _fix())
+    moved = _fix(lat=10 * STEP)
+    assert ingest.check("t", moved).accepted
+    ingest.rollback("t", moved)
+    # Compared against the first fix again
+    assert ingest.check("t", _fix(lat=STEP)).reason == location_filter.TOO_CLOSE
+    assert ingest.check("t", moved).accepted
+
+
+def test_take_trailing_returns_last_stationary_fix(ingest):
+    stored_at = datetime(2025, 6, 1, 12, 0, 0)
+    _store(ingest, "t", _fix(), stored_at=stored_at)
+    time.sleep(0.01)
+    _store(ingest, "t", _fix(lat=STEP))
+    last = _fix(lat=2 * STEP)
+    _store(ingest, "t", last)
+
+    location, timestamp = ingest.take_trailing("t")
+    assert location == last
+    assert timestamp > stored_at
+    assert ingest.take_trailing("t") is None
+
+
+def test_accepted_fix_clears_trailing(ingest):
+    _store(ingest, "t", _fix())
+    _store(ingest, "t", _fix(lat=STEP))
+    _store(ingest, "t", _fix(lat=10 * STEP))
+    assert ingest.take_trailing("t") is None
+
+
+def test_inaccurate_fix_is_not_kept_as_trailing(ingest):
+    _store(ingest, "t", _fix())
+    _store(ingest, "t", _fix(accuracy=500.0))
+    assert ingest.take_trailing("t") is None
+
+
+def test_stats_count_accepted_and_filtered(ingest):
+    _store(ingest, "t", _fix())
+    _store(ingest, "t", _fix(lat=STEP))
+    _store(ingest, "t", _fix(accuracy=500.0))
+    _store(ingest, "u", _fix())
+
+    stats = ingest.trip_stats("t")
+    assert stats["received"] == 3
+    assert stats["accepted"] == 1
+    assert stats["filtered"] == 2
+    assert stats["filtered_by_reason"] == {"too_close": 1, "low_accuracy": 1}
+    assert ingest.stats()["accepted"] == 2
+    assert ingest.stats()["tracked_trips"] == 2
+
+
+def test_least_recently_used_trip_is_evicted():
+    ingest = LocationIngestFilter(FilterSettings(), max_trips=2)
+    _store(ingest, "a", _fix())
+    _store(ingest, "b", _fix())
+    _store(ingest, "a", _fix(lat=1.0))
+    _store(ingest, "c", _fix())
+
+    assert ingest.stats()["tracked_trips"] == 2
+    assert ingest.trip_stats("b")["received"] == 0
+    assert ingest.trip_stats("a")["received"] == 2
+
+
+def test_update_settings_merges_and_ignores_null(ingest):
+    updated = ingest.update_settings(
+        "t", LocationFilterSettingsUpdate(min_distance=20.0, max_accuracy=None, enabled=None)
+    )
+    assert updated == FilterSettings(enabled=True, min_distance=20.0, min_interval=0, max_accuracy=50.0)
+    assert ingest.get_settings("other") == ingest.defaults
+
+    # Filtering with the merged settings must not fail
+    _store(ingest, "t", _fix(accuracy=10.0))
+    assert ingest.check("t", _fix(lat=10 * STEP, accuracy=10.0)).reason == location_filter.TOO_CLOSE
+
+
+@pytest.mark.parametrize("field", ["min_distance", "min_interval", "max_accuracy"])
+def test_negative_settings_are_rejected(field):
+    with pytest.raises(ValidationError):
+        LocationFilterSettingsUpdate(**{field: -1})
+
+
+def test_forget_drops_trip_state(ingest):
+    _store(ingest, "t", _fix())
+    ingest.forget("t")
+    assert ingest.check("t", _fix()).accepted